@@ -1,30 +1,80 @@
 import streamlit as st
 import asyncio
-import tempfile
-import os
+import concurrent.futures
+import queue
+import threading
 from pathlib import Path
 from tts import EdgeTTSWithAccents
-import time
 
-# Initialize TTS engine
-tts_engine = EdgeTTSWithAccents()
+# Initialize TTS engine once and share it across reruns and sessions
+@st.cache_resource(show_spinner=False)
+def get_tts_engine():
+    return EdgeTTSWithAccents()
+
+tts_engine = get_tts_engine()
+
+# Run TTS coroutines on one long-lived event loop instead of starting a
+# new loop with asyncio.run() on every click
+@st.cache_resource(show_spinner=False)
+def get_event_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def run_async(coro, updates=None, on_update=None):
+    """Run a coroutine on the background loop and wait for its result
+
+    Streamlit elements can only be updated from the script thread, so values
+    the coroutine puts on the updates queue are handed to on_update here.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    if updates is not None:
+        future.add_done_callback(lambda _: updates.put(None))
+    try:
+        while True:
+            if updates is not None:
+                try:
+                    value = updates.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+                else:
+                    if value is None:
+                        return future.result()
+                    on_update(value)
+                    continue
+            else:
+                try:
+                    return future.result(timeout=0.1)
+                except concurrent.futures.TimeoutError:
+                    pass
+            # Streamlit only acts on a rerun or stop when the script touches
+            # session state or an element, so do that between waits
+            st.session_state.get("pending_stream")
+    except BaseException:
+        # Interrupted by a rerun or stop (or the coroutine failed); don't
+        # leave it running on the shared loop for audio nobody will hear
+        future.cancel()
+        raise
 
 # Initialize session state
 if 'last_text' not in st.session_state:
     st.session_state.last_text = ""
-if 'last_audio_path' not in st.session_state:
-    st.session_state.last_audio_path = None
-if 'is_processing' not in st.session_state:
-    st.session_state.is_processing = False
-if 'last_typing_time' not in st.session_state:
-    st.session_state.last_typing_time = 0
-if 'typing_timer' not in st.session_state:
-    st.session_state.typing_timer = None
+if 'last_audio' not in st.session_state:
+    st.session_state.last_audio = None
+if 'last_audio_key' not in st.session_state:
+    st.session_state.last_audio_key = None
+if 'pending_stream' not in st.session_state:
+    st.session_state.pending_stream = False
 if 'auto_streaming' not in st.session_state:
     st.session_state.auto_streaming = False
 if 'stream_progress' not in st.session_state:
     st.session_state.stream_progress = 0
 
+def on_text_change():
+    # Streamlit only commits text area edits on blur or Ctrl+Enter, so each
+    # change is already a settled edit; flag it for the auto-streamer
+    st.session_state.pending_stream = True
+
 # Page config
 st.set_page_config(
     page_title="Text-to-Speech",
@@ -46,7 +96,7 @@ with st.sidebar:
     # Accent selection
     accent = st.selectbox(
         "Select Accent",
-        options=list(tts_engine.available_accents.keys()),
+        options=tts_engine.accent_names,
         index=0
     )
     
@@ -72,52 +122,56 @@ with st.sidebar:
         index=0
     )
 
-# Main content
-col1, col2 = st.columns([2, 1])
+# Every handler below speaks with the selected voice
+voice_index = tts_engine.voice_indices[(accent, gender, voice)]
 
-with col1:
-    # Text input
-    text = st.text_area(
-        "Enter your text here",
-        placeholder="Type or paste the text you want to convert to speech...",
-        height=200,
-        key="text_input"
-    )
+# Main content; widgets in the panel rerun only the panel, not the whole page
+@st.fragment
+def main_panel(accent, gender, voice, voice_index, mode):
+    col1, col2 = st.columns([2, 1])
+
+    with col1:
+        # Text input
+        text = st.text_area(
+            "Enter your text here",
+            placeholder="Type or paste the text you want to convert to speech...",
+            height=200,
+            key="text_input",
+            on_change=on_text_change
+        )
     
-    # Progress bar
-    progress_bar = st.progress(st.session_state.stream_progress / 100)
+        # Progress bar
+        progress_bar = st.progress(st.session_state.stream_progress / 100)
     
-    # Status message
-    status = st.empty()
+        # Status message
+        status = st.empty()
     
-    # Audio output
-    audio_output = st.empty()
+        # Audio output
+        audio_output = st.empty()
 
-with col2:
-    if mode == "Normal Mode":
-        st.markdown("### Generate and Download")
-        if st.button("Generate Speech", type="primary"):
-
-            async def generate_speech():
-                if text.strip():
+    with col2:
+        if mode == "Normal Mode":
+            st.markdown("### Generate and Download")
+            if st.button("Generate Speech", type="primary"):
+                if text.strip() and (text, voice) == st.session_state.last_audio_key:
+                    # Same text and voice as the last generation; reuse its audio
+                    audio_output.audio(st.session_state.last_audio, format="audio/mp3")
+                    status.success("Speech generated successfully!")
+                elif text.strip():
                     with st.spinner("Generating speech..."):
                         try:
-                            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                                temp_path = temp_file.name
-                                st.session_state.last_audio_path = temp_path
-                            
-                            voice_index = voices.index(voice)
-                            output_file = await tts_engine.convert_text_to_speech(
+                            audio_bytes = run_async(tts_engine.synthesize(
                                 text=text,
                                 accent=accent,
                                 gender=gender,
-                                voice_index=voice_index,
-                                output_file=temp_path
-                            )
-                            
-                            if output_file:
+                                voice_index=voice_index
+                            ))
+                        
+                            if audio_bytes:
                                 st.session_state.last_text = text
-                                audio_output.audio(str(output_file))
+                                st.session_state.last_audio = audio_bytes
+                                st.session_state.last_audio_key = (text, voice)
+                                audio_output.audio(audio_bytes, format="audio/mp3")
                                 status.success("Speech generated successfully!")
                             else:
                                 status.error("Failed to generate speech. Please try again.")
@@ -125,45 +179,37 @@ with col2:
                             status.error(f"An error occurred: {str(e)}")
                 else:
                     status.warning("Please enter some text to convert to speech.")
-
-            asyncio.run(generate_speech())
         
-        if st.button("Download Audio"):
-            if st.session_state.last_audio_path and os.path.exists(st.session_state.last_audio_path):
-                with open(st.session_state.last_audio_path, 'rb') as f:
-                    st.download_button(
-                        label="Download Audio File",
-                        data=f,
-                        file_name="generated_speech.mp3",
-                        mime="audio/mp3"
-                    )
-            else:
-                status.warning("No audio file available to download")
+            # Serve the audio already held in memory; disabled until there is some
+            st.download_button(
+                label="Download Audio",
+                data=st.session_state.last_audio or b"",
+                file_name="generated_speech.mp3",
+                mime="audio/mp3",
+                disabled=not st.session_state.last_audio
+            )
     
-    else:  # Stream Mode
-        st.markdown("### Stream Audio")
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("Start Auto-Streaming", type="primary"):
-                st.session_state.auto_streaming = True
-                status.info("Auto-streaming started!")
-        with col2:
-            if st.button("Stop Auto-Streaming"):
-                st.session_state.auto_streaming = False
-                status.info("Auto-streaming stopped!")
+        else:  # Stream Mode
+            st.markdown("### Stream Audio")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Start Auto-Streaming", type="primary"):
+                    st.session_state.auto_streaming = True
+                    status.info("Auto-streaming started!")
+            with col2:
+                if st.button("Stop Auto-Streaming"):
+                    st.session_state.auto_streaming = False
+                    status.info("Auto-streaming stopped!")
         
-        if st.button("Replay Last Audio"):
-
-            async def replay_audio():
+            if st.button("Replay Last Audio"):
                 if st.session_state.last_text:
                     try:
-                        voice_index = voices.index(voice)
-                        success = await tts_engine.stream_text_to_speech(
+                        success = run_async(tts_engine.stream_text_to_speech(
                             text=st.session_state.last_text,
                             accent=accent,
                             gender=gender,
                             voice_index=voice_index
-                        )
+                        ))
                         if success:
                             status.success("Last audio replayed successfully!")
                         else:
@@ -173,29 +219,34 @@ with col2:
                 else:
                     status.warning("No previous text to replay.")
 
-            asyncio.run(replay_audio())
+    # Auto-streaming logic: speak each committed edit once
+    if st.session_state.pending_stream:
+        st.session_state.pending_stream = False
+        if mode == "Stream Mode" and st.session_state.auto_streaming and text.strip():
+            progress_updates = queue.SimpleQueue()
 
-# Auto-streaming logic
-if mode == "Stream Mode" and text.strip() and st.session_state.auto_streaming:
-    current_time = time.time()
-    if current_time - st.session_state.last_typing_time >= 1:  # 1 second delay
+            def update_progress(fraction):
+                st.session_state.stream_progress = int(fraction * 100)
+                progress_bar.progress(fraction)
 
-        async def stream_with_progress(text, accent, gender, voice, progress_bar):
             try:
-                voice_index = voices.index(voice)
-                for i in range(100):
-                    st.session_state.stream_progress = i + 1
-                    progress_bar.progress(st.session_state.stream_progress / 100)
-                    await asyncio.sleep(0.01)  # Simulate progress
-                
-                success = await tts_engine.stream_text_to_speech(
-                    text=text,
-                    accent=accent,
-                    gender=gender,
-                    voice_index=voice_index
-                )
-                
+                # The progress bar only moves once words come back, so show a
+                # spinner for the time before the first one arrives
+                with st.spinner("Streaming speech..."):
+                    success = run_async(
+                        tts_engine.stream_text_to_speech(
+                            text=text,
+                            accent=accent,
+                            gender=gender,
+                            voice_index=voice_index,
+                            progress_callback=progress_updates.put
+                        ),
+                        updates=progress_updates,
+                        on_update=update_progress
+                    )
+            
                 if success:
+                    st.session_state.last_text = text
                     status.success("Speech streamed successfully!")
                 else:
                     status.error("Failed to stream speech. Please try again.")
@@ -205,11 +256,7 @@ if mode == "Stream Mode" and text.strip() and st.session_state.auto_streaming:
                 st.session_state.stream_progress = 0
                 progress_bar.progress(0)
 
-        asyncio.run(stream_with_progress(text, accent, gender, voice, progress_bar))
-    else:
-        status.info("Typing detected...")
-    
-    st.session_state.last_typing_time = current_time
+main_panel(accent, gender, voice, voice_index, mode)
 
 # Footer
 st.markdown("---")
@@ -1,32 +1,79 @@
-# !pip install edge-tts
-# !pip install nltk
 import os
 import sys
 import argparse
 import asyncio
-from pathlib import Path
+import hashlib
+import io
+import json
+import re
 import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import edge_tts
+except ImportError:
+    edge_tts = None
 
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt
-from rich.progress import Progress
 from rich.table import Table
 
 console = Console()
 
+# Sentence ends followed by the start of a new sentence, clause breaks after
+# semicolons, and blank lines for text without capitalization
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'])|(?<=;)\s+|\n\s*\n')
+SPEAKABLE = re.compile(r'\w')
+
+
+def split_sentences(text):
+    """Split text into the sentences that are synthesized concurrently
+
+    Edge TTS sends no audio back for a request with nothing speakable in it,
+    so pieces like "***" or "..." are kept together with a neighbouring sentence.
+    """
+    sentences = []
+    for piece in SENTENCE_BOUNDARY.split(text.strip()):
+        if not piece.strip():
+            continue
+        if sentences and not (SPEAKABLE.search(piece) and SPEAKABLE.search(sentences[-1])):
+            sentences[-1] += " " + piece
+        else:
+            sentences.append(piece)
+    return sentences
+
 
 class EdgeTTSWithAccents:
 
+    # Upper bound on the MP3 bytes kept for repeated (text, voice) requests
+    AUDIO_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    # Most requests to Edge TTS allowed in flight at once across all callers
+    MAX_CONCURRENT_SYNTHESIS = 3
+    # Upper bound on the decoded PCM bytes kept so replays skip MP3 decoding
+    SOUND_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    # Where the Edge TTS voice list is kept between runs, and for how long
+    VOICES_CACHE_FILE = Path.home() / ".cache" / "edge_tts_voices.json"
+    VOICES_CACHE_TTL = 24 * 60 * 60
+
     def __init__(self):
         self.output_dir = Path("generated_audio")
         self.output_dir.mkdir(exist_ok=True)
         
-        if not self._ensure_edge_tts():
-            console.print("[bold red]Failed to install edge-tts. Please install it manually with: pip install edge-tts[/bold red]")
+        self._audio_cache = OrderedDict()
+        self._audio_cache_bytes = 0
+        self._synthesis_slots = None
+        self._sound_cache = OrderedDict()
+        self._sound_cache_bytes = 0
+        self._voices = None
+        self._voices_by_name = {}
+        
+        if edge_tts is None:
+            console.print("[bold red]edge-tts is not installed. Please install it with: pip install edge-tts[/bold red]")
             sys.exit(1)
             
-        import edge_tts
         self.edge_tts = edge_tts
         
         self.available_accents = {
@@ -59,77 +106,75 @@ class EdgeTTSWithAccents:
                 "Female": ["en-ZA-LeahNeural"]
             }
         }
+        self.accent_names = list(self.available_accents.keys())
         
         self.voice_gender = {
-            voice: "Male" if "Guy" in voice or "Christopher" in voice or "Ryan" in voice or 
-                             "Thomas" in voice or "Prabhat" in voice or "William" in voice or
-                             "Connor" in voice or "Liam" in voice or "Luke" in voice else "Female"
-            for accent, voices in self.available_accents.items()
+            voice: gender
+            for genders in self.available_accents.values()
+            for gender, voices in genders.items()
             for voice in voices
         }
         
-    def _ensure_edge_tts(self):
-        """Check if edge-tts is installed, install if not"""
+        # Every voice of an accent, for requests that don't specify a gender
+        self.accent_voices = {
+            accent: [voice for voices in genders.values() for voice in voices]
+            for accent, genders in self.available_accents.items()
+        }
+        
+        # Reverse lookup of a voice's position within its accent and gender
+        self.voice_indices = {
+            (accent, gender, voice): index
+            for accent, genders in self.available_accents.items()
+            for gender, voices in genders.items()
+            for index, voice in enumerate(voices)
+        }
+        
+    def _load_cached_voices(self):
+        """Read the voice list saved by a recent run, if there is one"""
         try:
-            import edge_tts
-            return True
-        except ImportError:
-            console.print("[yellow]edge-tts not installed. Installing...[/yellow]")
-            try:
-                import subprocess
-                subprocess.check_call([sys.executable, "-m", "pip", "install", "edge-tts"])
-    
-                try:
-                    import edge_tts
-                    return True
-                except ImportError:
-                    return False
-            except Exception as e:
-                console.print(f"[bold red]Error installing edge-tts: {str(e)}[/bold red]")
-                return False
-                
-    def _ensure_player(self):
-        """Check if audio player dependencies are installed"""
+            if time.time() - self.VOICES_CACHE_FILE.stat().st_mtime < self.VOICES_CACHE_TTL:
+                return json.loads(self.VOICES_CACHE_FILE.read_text())
+        except (OSError, ValueError):
+            pass
+        return None
+        
+    def _save_cached_voices(self, voices):
+        """Save the voice list for later runs; the cache is best effort"""
         try:
-            import pygame
-            return True
-        except ImportError:
-            try:
-                import playsound
-                return True
-            except ImportError:
-                console.print("[yellow]Audio player not installed. Installing pygame...[/yellow]")
-                try:
-                    import subprocess
-                    subprocess.check_call([sys.executable, "-m", "pip", "install", "pygame"])
-                    return True
-                except Exception as e:
-                    console.print(f"[bold red]Error installing pygame: {str(e)}[/bold red]")
-                    return False
-                    
+            self.VOICES_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+            self.VOICES_CACHE_FILE.write_text(json.dumps(voices))
+        except OSError:
+            pass
+            
     async def get_available_voices(self):
-        """Get all available voices from Edge TTS"""
-        voices = await self.edge_tts.VoicesManager.create()
-        return voices.voices
+        """Get all available voices from Edge TTS, downloading them at most once a day"""
+        if self._voices is None:
+            voices = self._load_cached_voices()
+            if voices is None:
+                voices = (await self.edge_tts.VoicesManager.create()).voices
+                self._save_cached_voices(voices)
+            self._voices = voices
+            self._voices_by_name = {v["ShortName"]: v for v in voices}
+        return self._voices
         
     async def list_available_accents(self, detailed=False):
         """Display available accent options"""
         if not detailed:
-            console.print(Panel("\n".join([f"- {accent}" for accent in self.available_accents.keys()]),
+            console.print(Panel("\n".join([f"- {accent}" for accent in self.accent_names]),
                               title="Available Accents", style="blue"))
         else:
 
-            voices = await self.get_available_voices()
+            await self.get_available_voices()
 
             table = Table(title="Available Accents and Voices")
             table.add_column("Accent", style="cyan")
             table.add_column("Voice", style="green")
             table.add_column("Gender", style="magenta")
             
-            for accent, voice_list in self.available_accents.items():
+            for accent, voice_list in self.accent_voices.items():
                 for i, voice_name in enumerate(voice_list):
         
-                    voice_details = next((v for v in voices if v["ShortName"] == voice_name), None)
+                    voice_details = self._voices_by_name.get(voice_name)
                     
                     if voice_details:
             
@@ -164,28 +209,129 @@ class EdgeTTSWithAccents:
         
         console.print(table)
         
-    async def convert_text_to_speech(self, text, accent, gender=None, voice_index=0, output_file=None):
-        """Convert text to speech with the specified accent and gender"""
+    async def _resolve_voice(self, accent, gender=None, voice_index=0):
+        """Pick the voice for an accent, gender and index, or None if invalid"""
         if accent not in self.available_accents:
             console.print(f"[bold red]Error:[/bold red] Invalid accent '{accent}'. Please choose from available accents.")
             await self.list_available_accents()
-            return False
+            return None
             
         if gender:
             voices = self.available_accents[accent].get(gender, [])
             if not voices:
                 console.print(f"[bold red]Error:[/bold red] No voices available for {gender} in {accent} accent.")
-                return False
+                return None
         else:
-
-            voices = []
-            for gender_voices in self.available_accents[accent].values():
-                voices.extend(gender_voices)
+            voices = self.accent_voices[accent]
             
         if voice_index >= len(voices):
             voice_index = 0
             
-        voice = voices[voice_index]
+        return voices[voice_index]
+        
+    @staticmethod
+    def _word_progress(text, progress_callback):
+        """Turn per-word notifications into progress fractions (0.0-1.0) for text"""
+        if not progress_callback:
+            return None
+            
+        total_words = max(len(text.split()), 1)
+        spoken_words = 0
+        
+        def on_word():
+            nonlocal spoken_words
+            spoken_words += 1
+            progress_callback(min(spoken_words / total_words, 1.0))
+            
+        return on_word
+        
+    async def _synthesize(self, text, voice, on_word=None):
+        """Stream the speech for text into memory and return the MP3 bytes
+
+        If given, on_word is called for every word boundary the service reports.
+        Results are kept in a bounded LRU cache so repeated requests skip the
+        round trip to the service.
+        """
+        key = (hashlib.blake2b(text.encode()).digest(), voice)
+        cached = self._audio_cache.get(key)
+        if cached is not None:
+            self._audio_cache.move_to_end(key)
+            if on_word:
+                for _ in text.split():
+                    on_word()
+            return cached
+            
+        if self._synthesis_slots is None:
+            # Created lazily so it belongs to the loop that runs synthesis
+            self._synthesis_slots = asyncio.Semaphore(self.MAX_CONCURRENT_SYNTHESIS)
+            
+        communicate = self.edge_tts.Communicate(text, voice)
+        chunks = []
+        
+        async with self._synthesis_slots:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    chunks.append(chunk["data"])
+                elif chunk["type"] == "WordBoundary" and on_word:
+                    on_word()
+                
+        # Join once into an exactly sized buffer instead of growing one
+        audio = b"".join(chunks)
+        self._cache_audio(key, audio)
+        return audio
+        
+    def _cache_audio(self, key, audio):
+        """Store audio under key, evicting the least recently used entries"""
+        if key in self._audio_cache or len(audio) > self.AUDIO_CACHE_MAX_BYTES:
+            return
+            
+        self._audio_cache[key] = audio
+        self._audio_cache_bytes += len(audio)
+        while self._audio_cache_bytes > self.AUDIO_CACHE_MAX_BYTES:
+            _, evicted = self._audio_cache.popitem(last=False)
+            self._audio_cache_bytes -= len(evicted)
+        
+    async def _synthesize_sentences(self, text, voice, on_word=None):
+        """Synthesize each sentence of text concurrently, yielding the MP3 bytes
+        in order as soon as a sentence and all the ones before it are ready"""
+        sentences = split_sentences(text)
+        
+        async def synthesize_sentence(index, sentence):
+            return index, await self._synthesize(sentence, voice, on_word)
+            
+        tasks = [asyncio.create_task(synthesize_sentence(i, s)) for i, s in enumerate(sentences)]
+        ready = {}
+        next_index = 0
+        
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, audio = await next_done
+                ready[index] = audio
+                while next_index in ready:
+                    yield ready.pop(next_index)
+                    next_index += 1
+        finally:
+            # Don't leave synthesis running if the consumer stops early
+            for task in tasks:
+                task.cancel()
+        
+    async def synthesize(self, text, accent, gender=None, voice_index=0, progress_callback=None):
+        """Convert text to speech and return the MP3 bytes without touching disk"""
+        voice = await self._resolve_voice(accent, gender, voice_index)
+        if not voice:
+            return False
+            
+        try:
+            return await self._synthesize(text, voice, self._word_progress(text, progress_callback))
+        except Exception as e:
+            console.print(f"[bold red]Error generating speech: {str(e)}[/bold red]")
+            return False
+        
+    async def convert_text_to_speech(self, text, accent, gender=None, voice_index=0, output_file=None):
+        """Convert text to speech with the specified accent and gender"""
+        voice = await self._resolve_voice(accent, gender, voice_index)
+        if not voice:
+            return False
         
         if not output_file:
             output_file = self.output_dir / f"output_{accent.lower().replace(' ', '_')}.mp3"
@@ -195,15 +341,8 @@ class EdgeTTSWithAccents:
         console.print(f"Converting text to speech with [bold]{accent}[/bold] accent (Voice: {voice})...")
         
         try:
-
-            communicate = self.edge_tts.Communicate(text, voice)
-
-            with Progress() as progress:
-                task = progress.add_task("[green]Generating speech...", total=100)
-                progress.update(task, advance=30)
-                
-                await communicate.save(str(output_file))
-                progress.update(task, advance=70)
+            audio = await self._synthesize(text, voice)
+            output_file.write_bytes(audio)
                 
             console.print(f"[bold green]Success![/bold green] Audio saved to: {output_file}")
             return str(output_file)
@@ -212,31 +351,89 @@ class EdgeTTSWithAccents:
             console.print(f"[bold red]Error generating speech: {str(e)}[/bold red]")
             return False
             
-    async def play_audio(self, file_path):
-        """Play the generated audio file"""
-        if not self._ensure_player():
-            console.print(f"[yellow]Audio playback not available. File saved to: {file_path}[/yellow]")
-            return
+    def _decoded_sound(self, audio):
+        """Decode MP3 bytes into a pygame Sound, reusing earlier decodes of the same audio"""
+        import pygame
+        
+        key = hashlib.blake2b(audio).digest()
+        cached = self._sound_cache.get(key)
+        if cached is not None:
+            self._sound_cache.move_to_end(key)
+            return cached[0]
             
+        sound = pygame.mixer.Sound(io.BytesIO(audio))
+        # Decoded PCM is many times the size of the MP3, so budget by bytes,
+        # worked out from the mixer format since get_raw() would copy it all
+        frequency, sample_format, channels = pygame.mixer.get_init()
+        size = round(sound.get_length() * frequency) * (abs(sample_format) // 8) * channels
+        if size <= self.SOUND_CACHE_MAX_BYTES:
+            self._sound_cache[key] = (sound, size)
+            self._sound_cache_bytes += size
+            while self._sound_cache_bytes > self.SOUND_CACHE_MAX_BYTES:
+                _, (_, evicted_size) = self._sound_cache.popitem(last=False)
+                self._sound_cache_bytes -= evicted_size
+        return sound
+        
+    async def play_audio(self, audio):
+        """Play generated audio, given either as a file path or as MP3 bytes"""
+        in_memory = isinstance(audio, bytes)
         try:
             import pygame
+        except ImportError:
+            pygame = None
+            
+        if pygame:
             pygame.mixer.init()
-            pygame.mixer.music.load(file_path)
-            pygame.mixer.music.play()
+            if in_memory:
+                sound = self._decoded_sound(audio)
+                # The mixer is shared by every session, so when all channels
+                # are busy take over the oldest one instead of getting None
+                player = pygame.mixer.find_channel(True)
+                player.play(sound)
+                # Sleep through the known length of the sound, then catch the
+                # last few milliseconds of mixer latency with a short poll
+                length = sound.get_length()
+                poll_interval = 0.01
+            else:
+                # Stream files from disk instead of decoding them whole up front;
+                # their length isn't known, so poll at a relaxed interval
+                pygame.mixer.music.load(str(audio))
+                pygame.mixer.music.play()
+                player = pygame.mixer.music
+                length = 0
+                poll_interval = 0.1
 
             console.print("Playing audio... Press Ctrl+C to stop.")
             try:
-                while pygame.mixer.music.get_busy():
-                    await asyncio.sleep(0.1)
+                await asyncio.sleep(length)
+                while player.get_busy():
+                    await asyncio.sleep(poll_interval)
             except KeyboardInterrupt:
-                pygame.mixer.music.stop()
+                player.stop()
+            except asyncio.CancelledError:
+                player.stop()
+                raise
                 
-        except ImportError:
+        else:
             try:
-    
                 from playsound import playsound
-                import os
-    
+            except ImportError:
+                message = "Audio playback not available. Install pygame to enable it: pip install pygame"
+                if not in_memory:
+                    message += f". File saved to: {audio}"
+                console.print(f"[yellow]{message}[/yellow]")
+                return
+                
+            temp_path = None
+            try:
+                # playsound can only open files, and the engine is shared by
+                # every session, so give each in-memory clip its own file
+                file_path = audio
+                if in_memory:
+                    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
+                        temp_path = temp_file.name
+                        temp_file.write(audio)
+                    file_path = temp_path
                 abs_path = os.path.abspath(file_path)
     
                 normalized_path = abs_path.replace('\\', '/')
@@ -244,7 +441,14 @@ class EdgeTTSWithAccents:
                 playsound(normalized_path)
             except Exception as e:
                 console.print(f"[bold red]Error playing audio: {str(e)}[/bold red]")
-                console.print(f"[green]Audio file saved to: {file_path}[/green]")
+                if not in_memory:
+                    console.print(f"[green]Audio file saved to: {audio}[/green]")
+            finally:
+                if temp_path:
+                    try:
+                        os.unlink(temp_path)
+                    except OSError:
+                        pass
                 
     async def replay_audio(self, file_path):
         """Replay the audio file"""
@@ -254,46 +458,29 @@ class EdgeTTSWithAccents:
             replay_choice = Prompt.ask("[bold]Replay the audio?[/bold]", choices=["y", "n"], default="n")
             replay = replay_choice.lower() == "y"
 
-    async def stream_text_to_speech(self, text, accent, gender=None, voice_index=0):
-        """Stream text to speech as it's being entered"""
-        if accent not in self.available_accents:
-            console.print(f"[bold red]Error:[/bold red] Invalid accent '{accent}'. Please choose from available accents.")
-            await self.list_available_accents()
+    async def stream_text_to_speech(self, text, accent, gender=None, voice_index=0, progress_callback=None):
+        """Stream text to speech as it's being entered
+
+        If given, progress_callback is called with the fraction (0.0-1.0) of
+        words synthesized so far, as reported by the service.
+        """
+        voice = await self._resolve_voice(accent, gender, voice_index)
+        if not voice:
             return False
-            
-        if gender:
-            voices = self.available_accents[accent].get(gender, [])
-            if not voices:
-                console.print(f"[bold red]Error:[/bold red] No voices available for {gender} in {accent} accent.")
-                return False
-        else:
-            voices = []
-            for gender_voices in self.available_accents[accent].values():
-                voices.extend(gender_voices)
-            
-        if voice_index >= len(voices):
-            voice_index = 0
-            
-        voice = voices[voice_index]
         
         try:
-            # Create a temporary file for streaming
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                temp_path = temp_file.name
-                
-            communicate = self.edge_tts.Communicate(text, voice)
-            
-            # Start streaming the audio
-            await communicate.save(temp_path)
-            
-            # Play the audio immediately
-            await self.play_audio(temp_path)
+            on_word = self._word_progress(text, progress_callback)
             
-            # Clean up the temporary file
+            # Play each sentence as soon as it is ready while the rest are
+            # still being synthesized
+            sentences = self._synthesize_sentences(text, voice, on_word)
             try:
-                os.unlink(temp_path)
-            except:
-                pass
+                async for audio in sentences:
+                    await self.play_audio(audio)
+            finally:
+                # Close the pipeline right away so a cancelled or failed
+                # playback also cancels the sentences still in flight
+                await sentences.aclose()
                 
             return True
             
@@ -352,7 +539,7 @@ async def main_async():
             if mode == "stream":
                 console.print("[yellow]Enter text and press Enter to speak. Press Ctrl+C to stop.[/yellow]")
                 accent = Prompt.ask("[bold]Choose an accent[/bold]",
-                                  choices=list(tts_engine.available_accents.keys()))
+                                  choices=tts_engine.accent_names)
                 gender = Prompt.ask("[bold]Choose voice gender[/bold]",
                                   choices=["Male", "Female"],
                                   default="Female")
@@ -376,7 +563,7 @@ async def main_async():
                     break
                     
                 accent = Prompt.ask("[bold]Choose an accent[/bold]",
-                                  choices=list(tts_engine.available_accents.keys()))
+                                  choices=tts_engine.accent_names)
                     
                 gender = Prompt.ask("[bold]Choose voice gender[/bold]",
                                   choices=["Male", "Female"],